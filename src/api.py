@@ -2,22 +2,25 @@
 API REST para el sistema de Localización con IA
 Servidor FastAPI con endpoints para traducción y TTS
 """
-from fastapi import FastAPI, HTTPException, status, UploadFile, File, Depends, Request
-from file_processor import FileProcessor
-
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, status, UploadFile, File, Depends, Request, BackgroundTasks
+from fastapi.responses import FileResponse, ORJSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 from fastapi.staticfiles import StaticFiles
-from typing import Optional
+from typing import Optional, Dict
+import anyio
+import asyncio
+import hashlib
+import time
 import uvicorn
+import orjson
 from pathlib import Path
 import os
 import logging
-from datetime import datetime
 
-from hablai_core import LocalizationAI
+from hablai_core import LocalizationAI, TranslationError, TTSError
+from translation_cache import TranslationCache, cached_translation
 from file_processor import FileProcessor
-from auth import AuthService, get_current_active_user 
 
 from models import (
     TranslateRequest, TranslateResponse,
@@ -27,9 +30,10 @@ from models import (
     SignUpRequest, SignInRequest, AuthResponse, UserProfileResponse
 )
 from config import Config
-from auth import AuthService, get_current_active_user, supabase
+from auth import AuthService, get_current_active_user, init_supabase, get_supabase, get_supabase_admin, security
+from fastapi.security import HTTPAuthorizationCredentials
 
-from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi import Limiter
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
@@ -39,7 +43,8 @@ app = FastAPI(
     version=Config.API_VERSION,
     description=Config.API_DESCRIPTION,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
 # Configurar CORS
@@ -51,33 +56,93 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app = FastAPI(
-    title=Config.API_TITLE,
-    version=Config.API_VERSION,
-    description=Config.API_DESCRIPTION,
-    docs_url="/docs",
-    redoc_url="/redoc"
-)
-
 # Rate limiting
-limiter = Limiter(key_func=get_remote_address)
+# Si Redis no responde, los límites siguen aplicándose en memoria (por worker)
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=Config.RATE_LIMIT_STORAGE_URI,
+    strategy=Config.RATE_LIMIT_STRATEGY,
+    in_memory_fallback_enabled=True
+)
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    force=True
 )
 logger = logging.getLogger(__name__)
 
 
 # Montar carpeta de archivos estáticos (audios)
-app.mount("/audio", StaticFiles(directory=str(Config.OUTPUT_AUDIO_DIR)), name="audio")
+# Solo en desarrollo: en producción nginx/CDN sirve /audio (ver README)
+if Config.SERVE_AUDIO_FILES:
+    app.mount("/audio", StaticFiles(directory=str(Config.OUTPUT_AUDIO_DIR)), name="audio")
 
 # Inicializar sistema de localización
 ai = LocalizationAI()
 
+# Traducciones repetidas se sirven desde cache (Redis si está configurado)
+translation_cache = TranslationCache(
+    Config.REDIS_URL,
+    ttl=Config.TRANSLATION_CACHE_TTL,
+    max_chars=Config.TRANSLATION_CACHE_MAX_CHARS
+)
+translate = cached_translation(translation_cache, Config.SOURCE_LANGUAGE)(ai.translate_text_async)
+
+# ============================================================================
+# AUDIO CACHE
+# ============================================================================
+
+# Un lock por audio en curso: peticiones simultáneas no sintetizan dos veces
+_audio_locks: Dict[str, asyncio.Lock] = {}
+
+def _audio_path(translated: str, lang: str) -> Path:
+    """Ruta del MP3 para (idioma, texto): el archivo se nombra por el hash del contenido"""
+    audio_key = hashlib.blake2b(f"{lang}\x00{translated}".encode(), digest_size=16).hexdigest()
+    return Config.OUTPUT_AUDIO_DIR / f"{audio_key}.mp3"
+
+async def _synthesize_audio(translated: str, lang: str) -> str:
+    """
+    Devuelve la ruta del MP3 para (idioma, texto)
+    Solo se genera si no existe ya en disco
+    """
+    audio_path = _audio_path(translated, lang)
+    audio_key = audio_path.stem
+    
+    if audio_path.exists():
+        return str(audio_path)
+    
+    lock = _audio_locks.setdefault(audio_key, asyncio.Lock())
+    try:
+        async with lock:
+            if not audio_path.exists():
+                generated = await ai.text_to_speech_async(translated, lang, output_dir=str(Config.OUTPUT_AUDIO_DIR))
+                os.replace(generated, audio_path)
+    finally:
+        if not lock.locked():
+            _audio_locks.pop(audio_key, None)
+    
+    return str(audio_path)
+
+# ============================================================================
+# BACKGROUND TASKS
+# ============================================================================
+
+async def _persist_localization(user_id: str, translation_record: dict, audio_file: str, audio_url: str):
+    """Guarda la traducción y su audio en la base de datos (fuera del request)"""
+    try:
+        # Both inserts run in one transaction (see save_localization migration)
+        await get_supabase_admin().rpc('save_localization', {
+            'p_user_id': user_id,
+            **{f"p_{key}": value for key, value in translation_record.items()},
+            'p_audio_file_path': audio_file,
+            'p_audio_url': audio_url
+        }).execute()
+    except Exception:
+        logger.exception("Supabase error saving localization for user %s", user_id)
+
 # ============================================================================
 # ENDPOINTS
 # ============================================================================
@@ -96,22 +161,33 @@ async def root():
 # HEALTH
 # ============================================================================    
 
+# Estado de la base de datos cacheado: los probes no consultan Supabase cada vez
+HEALTH_DB_CHECK_TTL = 5  # seconds
+_db_status = {"value": "connected", "ts": 0.0}
+
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
 async def health_check():
     """Health check - Verificar que el servicio está funcionando"""
-    try:
-        # Check database connection
-        supabase.table("user_profiles").select("id").limit(1).execute()
-        db_status = "connected"
-    except:
-        db_status = "disconnected"
+    now = time.monotonic()
+    if now - _db_status["ts"] > HEALTH_DB_CHECK_TTL:
+        _db_status["ts"] = now
+        try:
+            # Check database connection
+            await get_supabase().table("user_profiles").select("id").limit(1).execute()
+            _db_status["value"] = "connected"
+        except Exception:
+            _db_status["value"] = "disconnected"
     
-    return HealthResponse(
+    db_status = _db_status["value"]
+    
+    # Datos construidos aquí: model_construct evita la validación
+    health = HealthResponse.model_construct(
         status="healthy" if db_status == "connected" else "degraded",
         version=Config.API_VERSION,
         service=Config.API_TITLE,
         database=db_status
     )
+    return ORJSONResponse(health.model_dump())
 
 # ============================================================================
 # AUTH
@@ -149,6 +225,15 @@ async def sign_in(request: SignInRequest):
         password=request.password
     )
 
+@app.post("/auth/signout", tags=["Authentication"])
+async def sign_out(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """
+    Logout user
+    
+    Revokes the session and drops the cached credentials for the token
+    """
+    return await AuthService.sign_out(credentials.credentials)
+
 @app.get("/auth/me", response_model=UserProfileResponse, tags=["Authentication"])
 async def get_my_profile(current_user: dict = Depends(get_current_active_user)):
     """
@@ -177,15 +262,22 @@ async def get_my_profile(current_user: dict = Depends(get_current_active_user)):
 # LANGUAGES
 # ============================================================================    
 
+# El payload solo depende de Config: se serializa una vez al importar
+_LANGUAGES_BYTES = orjson.dumps({
+    "source_language": Config.SOURCE_LANGUAGE,
+    "source_language_name": Config.SOURCE_LANGUAGE_NAME,
+    "target_languages": Config.TARGET_LANGUAGES,
+    "total_languages": len(Config.TARGET_LANGUAGES)
+})
+
+# Validación de idioma: set y mensaje de error precalculados
+_SUPPORTED_LANGS = frozenset(Config.TARGET_LANGUAGES)
+_SUPPORTED_LANGS_STR = ", ".join(Config.TARGET_LANGUAGES)
+
 @app.get("/languages", response_model=LanguagesResponse, tags=["Languages"])
 async def get_languages():
     """Obtener lista de idiomas soportados"""
-    return LanguagesResponse(
-        source_language=Config.SOURCE_LANGUAGE,
-        source_language_name=Config.SOURCE_LANGUAGE_NAME,
-        target_languages=Config.TARGET_LANGUAGES,
-        total_languages=len(Config.TARGET_LANGUAGES)
-    )
+    return Response(content=_LANGUAGES_BYTES, media_type="application/json")
 # ============================================================================
 # TRANSLATE
 # ============================================================================    
@@ -195,6 +287,7 @@ async def get_languages():
 async def translate_text(
     request: Request,
     data: TranslateRequest,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_active_user)
 ):
     """
@@ -206,55 +299,50 @@ async def translate_text(
     - **text**: English text to translate
     - **target_language**: Target language code (es, fr, de, etc.)
     """
+    char_count = len(data.text)
+    log_id = None
+    
     try:
-        # Check and deduct credits
-        has_credits = await AuthService.check_and_deduct_credits(
-            current_user["id"], 
-            credits_needed=1
+        # Deduct credits and open the usage log in one round trip
+        log_id = await AuthService.reserve_and_log(
+            user_id=current_user["id"],
+            action_type="translate",
+            char_count=char_count,
+            target_languages=[data.target_language.value]
         )
         
-        if not has_credits:
+        if log_id is None:
             raise HTTPException(
                 status_code=402,
                 detail=f"Insufficient credits. You have {current_user['credits_remaining']} credits remaining. Upgrade your plan to continue."
             )
         
         # Translate
-        translated = ai.translate_text(data.text, data.target_language.value)
-        
-        if "Error" in str(translated):
-            await AuthService.log_usage(
-                user_id=current_user["id"],
-                action_type="translate",
-                char_count=len(data.text),
-                target_languages=[data.target_language.value],
-                success=False,
-                error_message=translated
-            )
+        try:
+            translated = await translate(data.text, data.target_language.value)
+        except TranslationError as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=translated
+                detail=str(e)
             )
         
-        # Log successful usage
-        await AuthService.log_usage(
-            user_id=current_user["id"],
-            action_type="translate",
-            char_count=len(data.text),
-            target_languages=[data.target_language.value],
-            success=True
-        )
-        
-        return TranslateResponse(
-            success=True,
-            source_text=data.text,
-            source_language=Config.SOURCE_LANGUAGE,
-            translated_text=translated,
-            target_language=data.target_language.value
-        )
-    except HTTPException:
+        # Mark usage as successful after the response is sent
+        background_tasks.add_task(AuthService.finalize_usage, log_id, success=True)
+        
+        return ORJSONResponse({
+            "success": True,
+            "source_text": data.text,
+            "source_language": Config.SOURCE_LANGUAGE,
+            "translated_text": translated,
+            "target_language": data.target_language.value
+        })
+    except HTTPException as e:
+        if log_id is not None:
+            await AuthService.finalize_usage(log_id, success=False, error_message=str(e.detail))
         raise
     except Exception as e:
+        if log_id is not None:
+            await AuthService.finalize_usage(log_id, success=False, error_message=str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Translation error: {str(e)}"
@@ -267,6 +355,7 @@ async def translate_text(
 async def text_to_speech(
     request: Request,
     data: TTSRequest,
+    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_active_user)
 ):
     """
@@ -280,104 +369,195 @@ async def text_to_speech(
     
     Returns translated text and downloadable MP3 audio
     """
+    char_count = len(data.text)
+    log_id = None
+    
     try:
-        # Check and deduct credits
-        has_credits = await AuthService.check_and_deduct_credits(
-            current_user["id"], 
-            credits_needed=1
+        # Deduct credits and open the usage log in one round trip
+        log_id = await AuthService.reserve_and_log(
+            user_id=current_user["id"],
+            action_type="tts",
+            char_count=char_count,
+            target_languages=[data.target_language.value]
         )
         
-        if not has_credits:
+        if log_id is None:
             raise HTTPException(
                 status_code=402,
                 detail=f"Insufficient credits. You have {current_user['credits_remaining']} credits remaining."
             )
         
         # Translate text
-        translated = ai.translate_text(data.text, data.target_language.value)
-        
-        if "Error" in str(translated):
-            await AuthService.log_usage(
-                user_id=current_user["id"],
-                action_type="tts",
-                char_count=len(data.text),
-                target_languages=[data.target_language.value],
-                success=False,
-                error_message=translated
-            )
+        try:
+            translated = await translate(data.text, data.target_language.value)
+        except TranslationError as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=translated
+                detail=str(e)
             )
         
         # Generate audio
-        audio_file = ai.text_to_speech(translated, data.target_language.value)
-        
-        if "Error" in str(audio_file):
-            await AuthService.log_usage(
-                user_id=current_user["id"],
-                action_type="tts",
-                char_count=len(data.text),
-                target_languages=[data.target_language.value],
-                success=False,
-                error_message=audio_file
-            )
+        try:
+            audio_file = await _synthesize_audio(translated, data.target_language.value)
+        except TTSError as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=audio_file
+                detail=str(e)
             )
         
         # Get audio filename and URL
-        audio_filename = os.path.basename(audio_file)
-        audio_url = f"/audio/{audio_filename}"
-        
-        # Save to database
-        try:
-            translation = supabase.table("translations").insert({
-                "user_id": current_user["id"],
+        audio_filename = audio_file.rsplit(os.sep, 1)[-1]
+        audio_url = f"{Config.AUDIO_BASE_URL}/{audio_filename}"
+        
+        # Save to database and mark usage as successful after the response is sent
+        background_tasks.add_task(
+            _persist_localization,
+            current_user["id"],
+            {
                 "source_text": data.text,
                 "translated_text": translated,
                 "source_language": Config.SOURCE_LANGUAGE,
                 "target_language": data.target_language.value,
-                "char_count": len(data.text)
-            }).execute()
-            
-            supabase.table("localizations").insert({
-                "user_id": current_user["id"],
-                "translation_id": translation.data[0]['id'],
-                "audio_file_path": audio_file,
-                "audio_url": audio_url
-            }).execute()
-        except Exception as db_error:
-            print(f"Database error: {str(db_error)}")
-        
-        # Log usage
-        await AuthService.log_usage(
+                "char_count": char_count
+            },
+            audio_file,
+            audio_url
+        )
+        
+        background_tasks.add_task(AuthService.finalize_usage, log_id, success=True)
+        
+        return ORJSONResponse({
+            "success": True,
+            "source_text": data.text,
+            "source_language": Config.SOURCE_LANGUAGE,
+            "translated_text": translated,
+            "target_language": data.target_language.value,
+            "audio_file": audio_filename,
+            "audio_url": audio_url,
+            "char_count": char_count
+        })
+        
+    except HTTPException as e:
+        if log_id is not None:
+            await AuthService.finalize_usage(log_id, success=False, error_message=str(e.detail))
+        raise
+    except Exception as e:
+        if log_id is not None:
+            await AuthService.finalize_usage(log_id, success=False, error_message=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"TTS error: {str(e)}"
+        )
+
+@app.post(
+    "/tts/stream",
+    tags=["Text-to-Speech"],
+    response_class=StreamingResponse,
+    responses={200: {"content": {"audio/mpeg": {}}}}
+)
+@limiter.limit("20/minute")
+async def text_to_speech_stream(
+    request: Request,
+    data: TTSRequest,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Translate text and stream the audio (TTS) as it is generated
+    
+    **Authentication required**
+    **Cost:** 1 credit
+    
+    - **text**: English text to translate and convert to audio
+    - **target_language**: Target language code
+    
+    Returns an audio/mpeg stream; each chunk is sent as soon as it is synthesized.
+    The audio is not stored, so nothing is saved to the localization history.
+    """
+    char_count = len(data.text)
+    lang = data.target_language.value
+    log_id = None
+    
+    try:
+        # Deduct credits and open the usage log in one round trip
+        log_id = await AuthService.reserve_and_log(
             user_id=current_user["id"],
             action_type="tts",
-            char_count=len(data.text),
-            target_languages=[data.target_language.value],
-            success=True
+            char_count=char_count,
+            target_languages=[lang]
         )
         
-        return TTSResponse(
-            success=True,
-            source_text=data.text,
-            source_language=Config.SOURCE_LANGUAGE,
-            translated_text=translated,
-            target_language=data.target_language.value,
-            audio_file=audio_filename,
-            audio_url=audio_url,
-            char_count=len(data.text)
-        )
+        if log_id is None:
+            raise HTTPException(
+                status_code=402,
+                detail=f"Insufficient credits. You have {current_user['credits_remaining']} credits remaining."
+            )
         
-    except HTTPException:
+        # Translate text
+        try:
+            translated = await translate(data.text, lang)
+        except TranslationError as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(e)
+            )
+        
+        # Audio already generated by /tts: send the client to the stored file
+        # (served by nginx/CDN outside development)
+        audio_path = _audio_path(translated, lang)
+        if audio_path.exists():
+            # Mark usage as successful after the response is sent
+            finalize = BackgroundTask(AuthService.finalize_usage, log_id, success=True)
+            if not Config.SERVE_AUDIO_FILES:
+                return RedirectResponse(
+                    f"{Config.AUDIO_BASE_URL}/{audio_path.name}", status_code=303, background=finalize
+                )
+            return FileResponse(audio_path, media_type="audio/mpeg", background=finalize)
+        
+        # Wait for the first chunk so errors can still be returned as a status code
+        audio_stream = ai.text_to_speech_stream(translated, lang)
+        try:
+            first_chunk = await audio_stream.__anext__()
+        except TTSError as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(e)
+            )
+    except HTTPException as e:
+        if log_id is not None:
+            await AuthService.finalize_usage(log_id, success=False, error_message=str(e.detail))
         raise
     except Exception as e:
+        if log_id is not None:
+            await AuthService.finalize_usage(log_id, success=False, error_message=str(e))
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"TTS error: {str(e)}"
         )
+    
+    async def body():
+        completed = False
+        error_message = "Client disconnected"
+        try:
+            yield first_chunk
+            async for chunk in audio_stream:
+                yield chunk
+            completed = True
+        except Exception as e:
+            # Headers are already sent: record the failure and cut the stream
+            logger.exception("TTS stream failed for user %s", current_user["id"])
+            error_message = str(e)
+            raise
+        finally:
+            # Also runs on client disconnect (CancelledError/GeneratorExit);
+            # shielded so the cancellation doesn't abort the cleanup
+            with anyio.CancelScope(shield=True):
+                await audio_stream.aclose()
+                await AuthService.finalize_usage(
+                    log_id, success=completed, error_message=None if completed else error_message
+                )
+    
+    return StreamingResponse(body(), media_type="audio/mpeg")
+
 # ============================================================================
 # FILE PROCESSING
 # ============================================================================
@@ -386,6 +566,7 @@ async def text_to_speech(
 @limiter.limit("10/minute")
 async def process_file(
     request: Request,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     target_language: str = "es",
     current_user: dict = Depends(get_current_active_user)
@@ -403,146 +584,133 @@ async def process_file(
     
     Returns translated text and downloadable MP3 audio
     """
+    char_count = 0
+    log_id = None
+    
     try:
         # Validate target language
-        if target_language not in Config.TARGET_LANGUAGES:
+        if target_language not in _SUPPORTED_LANGS:
             raise HTTPException(
                 status_code=400,
-                detail=f"Language '{target_language}' not supported. Supported: {list(Config.TARGET_LANGUAGES.keys())}"
+                detail=f"Language '{target_language}' not supported. Supported: {_SUPPORTED_LANGS_STR}"
             )
         
-        # Check and deduct credits
-        has_credits = await AuthService.check_and_deduct_credits(
-            current_user["id"], 
-            credits_needed=1
-        )
-        
-        if not has_credits:
+        # Reject unsupported or oversized files before any processing
+        if not FileProcessor.is_supported(file.filename):
             raise HTTPException(
-                status_code=402,
-                detail=f"Insufficient credits. You have {current_user['credits_remaining']} credits remaining."
+                status_code=400,
+                detail=f"Format not supported: {FileProcessor.get_file_extension(file.filename)}. Supported: {', '.join(FileProcessor.SUPPORTED_FORMATS)}"
             )
         
-        # Read file content
-        content = await file.read()
+        if file.size is not None and file.size > FileProcessor.MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum: {FileProcessor.MAX_FILE_SIZE // (1024 * 1024)} MB"
+            )
         
-        # Process file to extract text
-        file_result = await FileProcessor.process_file(content, file.filename)
+        # Starlette already spooled the upload (RAM up to 1 MB, disk beyond):
+        # hand that file to the processor instead of copying it
+        file.file.seek(0)
+        file_result = await FileProcessor.process_file(file.file, file.filename)
         
         if not file_result['success']:
-            await AuthService.log_usage(
-                user_id=current_user["id"],
-                action_type="process_file",
-                char_count=0,
-                target_languages=[target_language],
-                success=False,
-                error_message=file_result.get('error', 'Unknown error')
-            )
             raise HTTPException(
                 status_code=400,
                 detail=file_result.get('error', 'Error processing file')
             )
         
         text = file_result['text']
+        char_count = len(text)
         
         # Validate text length
-        if len(text) > Config.MAX_TEXT_LENGTH:
+        if char_count > Config.MAX_TEXT_LENGTH:
             raise HTTPException(
                 status_code=400,
-                detail=f"Text too long. Maximum: {Config.MAX_TEXT_LENGTH} characters. Found: {len(text)}"
+                detail=f"Text too long. Maximum: {Config.MAX_TEXT_LENGTH} characters. Found: {char_count}"
             )
         
-        if len(text) < 1:
+        if char_count < 1:
             raise HTTPException(
                 status_code=400,
                 detail="No text found in file"
             )
         
-        # Translate
-        translated = ai.translate_text(text, target_language)
-        
-        if "Error" in str(translated):
-            await AuthService.log_usage(
-                user_id=current_user["id"],
-                action_type="process_file",
-                char_count=len(text),
-                target_languages=[target_language],
-                success=False,
-                error_message=translated
+        # Extraction is local: only charge once the text is known to be valid
+        # Deduct credits and open the usage log in one round trip
+        log_id = await AuthService.reserve_and_log(
+            user_id=current_user["id"],
+            action_type="process_file",
+            char_count=char_count,
+            target_languages=[target_language]
+        )
+        
+        if log_id is None:
+            raise HTTPException(
+                status_code=402,
+                detail=f"Insufficient credits. You have {current_user['credits_remaining']} credits remaining."
             )
+        
+        # Translate
+        try:
+            translated = await translate(text, target_language)
+        except TranslationError as e:
             raise HTTPException(
                 status_code=500,
-                detail=f"Translation error: {translated}"
+                detail=str(e)
             )
         
         # Generate audio
-        audio_file = ai.text_to_speech(translated, target_language)
-        
-        if "Error" in str(audio_file):
-            await AuthService.log_usage(
-                user_id=current_user["id"],
-                action_type="process_file",
-                char_count=len(text),
-                target_languages=[target_language],
-                success=False,
-                error_message=audio_file
-            )
+        try:
+            audio_file = await _synthesize_audio(translated, target_language)
+        except TTSError as e:
             raise HTTPException(
                 status_code=500,
-                detail=f"TTS error: {audio_file}"
+                detail=str(e)
             )
         
         # Get audio filename and URL
-        audio_filename = os.path.basename(audio_file)
-        audio_url = f"/audio/{audio_filename}"
-        
-        # Save to database
-        try:
-            translation = supabase.table("translations").insert({
-                "user_id": current_user["id"],
+        audio_filename = audio_file.rsplit(os.sep, 1)[-1]
+        audio_url = f"{Config.AUDIO_BASE_URL}/{audio_filename}"
+        
+        # Save to database and mark usage as successful after the response is sent
+        background_tasks.add_task(
+            _persist_localization,
+            current_user["id"],
+            {
                 "source_text": text,
                 "translated_text": translated,
                 "source_language": Config.SOURCE_LANGUAGE,
                 "target_language": target_language,
-                "char_count": len(text),
+                "char_count": char_count,
                 "file_name": file.filename,
                 "file_format": file_result['format']
-            }).execute()
-            
-            supabase.table("localizations").insert({
-                "user_id": current_user["id"],
-                "translation_id": translation.data[0]['id'],
-                "audio_file_path": audio_file,
-                "audio_url": audio_url
-            }).execute()
-        except Exception as db_error:
-            print(f"Database error: {str(db_error)}")
-        
-        # Log usage
-        await AuthService.log_usage(
-            user_id=current_user["id"],
-            action_type="process_file",
-            char_count=len(text),
-            target_languages=[target_language],
-            success=True
+            },
+            audio_file,
+            audio_url
         )
         
-        return ProcessFileResponse(
-            success=True,
-            filename=file.filename,
-            format=file_result['format'],
-            source_text=text[:500] + "..." if len(text) > 500 else text,
-            source_language=Config.SOURCE_LANGUAGE,
-            translated_text=translated[:500] + "..." if len(translated) > 500 else translated,
-            target_language=target_language,
-            audio_file=audio_filename,
-            audio_url=audio_url,
-            char_count=len(text)
-        )
-        
-    except HTTPException:
+        background_tasks.add_task(AuthService.finalize_usage, log_id, success=True)
+        
+        return ORJSONResponse({
+            "success": True,
+            "filename": file.filename,
+            "format": file_result['format'],
+            "source_text": text[:500] + "..." if char_count > 500 else text,
+            "source_language": Config.SOURCE_LANGUAGE,
+            "translated_text": translated[:500] + "..." if len(translated) > 500 else translated,
+            "target_language": target_language,
+            "audio_file": audio_filename,
+            "audio_url": audio_url,
+            "char_count": char_count
+        })
+        
+    except HTTPException as e:
+        if log_id is not None:
+            await AuthService.finalize_usage(log_id, success=False, error_message=str(e.detail))
         raise
     except Exception as e:
+        if log_id is not None:
+            await AuthService.finalize_usage(log_id, success=False, error_message=str(e))
         raise HTTPException(
             status_code=500,
             detail=f"Error processing file: {str(e)}"
@@ -552,22 +720,51 @@ async def process_file(
 # EXCEPTION HANDLERS
 # ============================================================================
 
+def _error_body(status_code: int, detail) -> bytes:
+    """Serializa el cuerpo estándar de error"""
+    return orjson.dumps({
+        "success": False,
+        "error": detail,
+        "status_code": status_code
+    })
+
+# Errores frecuentes con cuerpo fijo: se serializan una sola vez
+_CACHED_ERROR_BODIES: Dict[tuple, bytes] = {
+    (401, "Invalid authentication credentials"): _error_body(401, "Invalid authentication credentials"),
+    (403, "Not authenticated"): _error_body(403, "Not authenticated"),
+}
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Manejador personalizado de excepciones HTTP"""
-    return JSONResponse(
+    body = None
+    if isinstance(exc.detail, str):
+        body = _CACHED_ERROR_BODIES.get((exc.status_code, exc.detail))
+    if body is None:
+        body = _error_body(exc.status_code, exc.detail)
+    
+    return Response(
+        content=body,
         status_code=exc.status_code,
-        content={
-            "success": False,
-            "error": exc.detail,
-            "status_code": exc.status_code
-        }
+        headers=getattr(exc, "headers", None),
+        media_type="application/json"
     )
 
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request, exc):
+    """Manejador de límite de peticiones (429) con cuerpo cacheado por límite"""
+    body = _CACHED_ERROR_BODIES.get((429, exc.detail))
+    if body is None:
+        # Un cuerpo por límite configurado ("30 per 1 minute", ...)
+        body = _CACHED_ERROR_BODIES[(429, exc.detail)] = _error_body(429, f"Rate limit exceeded: {exc.detail}")
+    
+    response = Response(content=body, status_code=429, media_type="application/json")
+    return request.app.state.limiter._inject_headers(response, request.state.view_rate_limit)
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
     """Manejador de excepciones generales"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "success": False,
@@ -583,6 +780,8 @@ async def general_exception_handler(request, exc):
 @app.on_event("startup")
 async def startup_event():
     """Evento ejecutado al iniciar el servidor"""
+    await init_supabase()
+    
     logger.info("="*60)
     logger.info(f"🚀 {Config.API_TITLE} v{Config.API_VERSION}")
     logger.info("="*60)
@@ -598,13 +797,17 @@ async def startup_event():
 # ============================================================================
 
 if __name__ == "__main__":
-    import os
+    # En producción se usa gunicorn + UvicornWorker (ver Dockerfile)
     port = int(os.getenv("PORT", Config.PORT))
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
     
     uvicorn.run(
         "api:app",
         host=Config.HOST,
         port=port,
         reload=False,  # Cambiado a False para producción
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
         log_level="info"
-    )
\ No newline at end of file
+    )
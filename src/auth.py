@@ -3,24 +3,71 @@ Authentication module using Supabase
 Handles user registration, login, and JWT token verification
 """
 
-from supabase import create_client, Client
+from supabase import acreate_client, AClient as AsyncClient
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional, Dict
+from cachetools import TTLCache
+import hashlib
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_KEY")
-)
+logger = logging.getLogger(__name__)
+
+# Supabase clients (async) - created once per worker by init_supabase()
+# supabase_admin uses the service-role key: server-only RPCs (credits,
+# usage logs, saved localizations) are not executable with the public key
+supabase: Optional[AsyncClient] = None
+supabase_admin: Optional[AsyncClient] = None
+
+
+async def init_supabase() -> AsyncClient:
+    """Create the shared async Supabase clients. Call on app startup."""
+    global supabase, supabase_admin
+    if supabase is None:
+        supabase = await acreate_client(
+            os.getenv("SUPABASE_URL"),
+            os.getenv("SUPABASE_KEY")
+        )
+    if supabase_admin is None:
+        service_key = os.getenv("SUPABASE_SERVICE_KEY")
+        if not service_key:
+            raise RuntimeError("SUPABASE_SERVICE_KEY is not set")
+        supabase_admin = await acreate_client(os.getenv("SUPABASE_URL"), service_key)
+    return supabase
+
+
+def get_supabase() -> AsyncClient:
+    """Return the shared Supabase client"""
+    if supabase is None:
+        raise RuntimeError("Supabase client not initialized")
+    return supabase
+
+
+def get_supabase_admin() -> AsyncClient:
+    """Return the shared service-role Supabase client"""
+    if supabase_admin is None:
+        raise RuntimeError("Supabase client not initialized")
+    return supabase_admin
 
 # Security
 security = HTTPBearer()
 
+# Short-lived caches so warm tokens skip the Supabase round-trips.
+# Token cache: hashed bearer token -> {"id", "email"}
+# Profile cache: user id -> tier/credits, dropped whenever credits change
+AUTH_CACHE_TTL = 60  # seconds
+_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=AUTH_CACHE_TTL)
+_profile_cache: TTLCache = TTLCache(maxsize=10_000, ttl=AUTH_CACHE_TTL)
+
+
+def _token_key(token: str) -> str:
+    """Hash the bearer token so raw tokens are never kept in memory"""
+    return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
 class AuthService:
     """Authentication service"""
     
@@ -39,7 +86,7 @@ class AuthService:
         """
         try:
             # Sign up with Supabase Auth
-            response = supabase.auth.sign_up({
+            response = await supabase.auth.sign_up({
                 "email": email,
                 "password": password,
                 "options": {
@@ -88,7 +135,7 @@ class AuthService:
             dict: Session and user data
         """
         try:
-            response = supabase.auth.sign_in_with_password({
+            response = await supabase.auth.sign_in_with_password({
                 "email": email,
                 "password": password
             })
@@ -100,7 +147,7 @@ class AuthService:
                 )
             
             # Get user profile
-            profile = supabase.table("user_profiles").select("*").eq("id", response.user.id).single().execute()
+            profile = await supabase.table("user_profiles").select("*").eq("id", response.user.id).single().execute()
             
             return {
                 "success": True,
@@ -137,32 +184,41 @@ class AuthService:
         """
         try:
             token = credentials.credentials
+            key = _token_key(token)
             
-            # Verify token with Supabase
-            user = supabase.auth.get_user(token)
-            
-            if user is None or user.user is None:
-                raise HTTPException(
-                    status_code=401,
-                    detail="Invalid authentication credentials"
-                )
+            identity = _token_cache.get(key)
+            if identity is None:
+                # Verify token with Supabase
+                user = await supabase.auth.get_user(token)
+                
+                if user is None or user.user is None:
+                    raise HTTPException(
+                        status_code=401,
+                        detail="Invalid authentication credentials"
+                    )
+                
+                identity = {"id": user.user.id, "email": user.user.email}
+                _token_cache[key] = identity
             
-            # Get user profile
-            profile = supabase.table("user_profiles").select("*").eq("id", user.user.id).single().execute()
-            
-            if not profile.data:
-                raise HTTPException(
-                    status_code=404,
-                    detail="User profile not found"
-                )
+            profile_data = _profile_cache.get(identity["id"])
+            if profile_data is None:
+                # Get user profile
+                profile = await supabase.table("user_profiles").select("*").eq("id", identity["id"]).single().execute()
+                
+                if not profile.data:
+                    raise HTTPException(
+                        status_code=404,
+                        detail="User profile not found"
+                    )
+                
+                profile_data = {
+                    "tier": profile.data.get("tier"),
+                    "credits_remaining": profile.data.get("credits_remaining"),
+                    "credits_limit": profile.data.get("credits_limit")
+                }
+                _profile_cache[identity["id"]] = profile_data
             
-            return {
-                "id": user.user.id,
-                "email": user.user.email,
-                "tier": profile.data.get("tier"),
-                "credits_remaining": profile.data.get("credits_remaining"),
-                "credits_limit": profile.data.get("credits_limit")
-            }
+            return {**identity, **profile_data}
             
         except HTTPException:
             raise
@@ -173,75 +229,109 @@ class AuthService:
             )
     
     @staticmethod
-    async def check_and_deduct_credits(user_id: str, credits_needed: int = 1) -> bool:
+    def invalidate_token(token: str) -> None:
         """
-        Check if user has enough credits and deduct them
+        Drop a bearer token from the auth cache
         
         Args:
-            user_id: User ID
-            credits_needed: Number of credits needed
+            token: HTTP Bearer token
+        """
+        identity = _token_cache.pop(_token_key(token), None)
+        if identity is not None:
+            _profile_cache.pop(identity["id"], None)
+    
+    @staticmethod
+    async def sign_out(token: str) -> Dict:
+        """
+        Logout user and revoke the session tied to the token
+        
+        Args:
+            token: HTTP Bearer token
         
         Returns:
-            bool: True if credits available and deducted, False otherwise
+            dict: Operation result
         """
+        AuthService.invalidate_token(token)
         try:
-            # Call PostgreSQL function
-            result = supabase.rpc('check_and_deduct_credits', {
-                'p_user_id': user_id,
-                'p_credits_needed': credits_needed
-            }).execute()
-            
-            return result.data if result.data is not None else False
-            
+            await supabase.auth.admin.sign_out(token)
         except Exception as e:
-            print(f"Error checking credits: {str(e)}")
-            return False
+            raise HTTPException(
+                status_code=400,
+                detail=f"Logout error: {str(e)}"
+            )
+        
+        return {"success": True, "message": "Signed out successfully"}
     
     @staticmethod
-    async def get_user_profile(user_id: str) -> Optional[Dict]:
+    async def reserve_and_log(user_id: str, action_type: str, char_count: int,
+                              target_languages: list, credits_needed: int = 1) -> Optional[str]:
         """
-        Get user profile by ID
+        Deduct credits and open a pending usage log in a single RPC
         
         Args:
             user_id: User ID
+            action_type: Type of action (translate, tts, process_file)
+            char_count: Number of characters to process
+            target_languages: List of target language codes
+            credits_needed: Number of credits needed
         
         Returns:
-            dict: User profile data or None
+            str: Usage log ID to finalize, or None if credits are insufficient
         """
         try:
-            profile = supabase.table("user_profiles").select("*").eq("id", user_id).single().execute()
-            return profile.data if profile.data else None
-        except Exception as e:
-            print(f"Error getting user profile: {str(e)}")
+            result = await get_supabase_admin().rpc('reserve_and_log', {
+                'p_user_id': user_id,
+                'p_action_type': action_type,
+                'p_char_count': char_count,
+                'p_target_languages': target_languages,
+                'p_credits_needed': credits_needed
+            }).execute()
+            
+            # Credits changed (or may have): force a fresh profile read
+            _profile_cache.pop(user_id, None)
+            
+            row = result.data[0] if result.data else None
+            return row["log_id"] if row and row.get("ok") else None
+            
+        except Exception:
+            logger.exception("Supabase error reserving credits for user %s", user_id)
             return None
     
     @staticmethod
-    async def log_usage(user_id: str, action_type: str, char_count: int, 
-                       target_languages: list, success: bool = True, 
-                       error_message: Optional[str] = None) -> None:
+    async def finalize_usage(log_id: str, success: bool, error_message: Optional[str] = None) -> None:
         """
-        Log user activity
+        Close a usage log opened by reserve_and_log
         
         Args:
-            user_id: User ID
-            action_type: Type of action (translate, localize, etc.)
-            char_count: Number of characters processed
-            target_languages: List of target language codes
+            log_id: Usage log ID
             success: Whether the action was successful
             error_message: Error message if any
         """
         try:
-            supabase.table("usage_logs").insert({
-                "user_id": user_id,
-                "action_type": action_type,
-                "char_count": char_count,
-                "target_languages": target_languages,
-                "credits_used": 1,
+            await get_supabase_admin().table("usage_logs").update({
                 "success": success,
                 "error_message": error_message
-            }).execute()
-        except Exception as e:
-            print(f"Error logging usage: {str(e)}")
+            }).eq("id", log_id).execute()
+        except Exception:
+            logger.exception("Supabase error finalizing usage log %s", log_id)
+    
+    @staticmethod
+    async def get_user_profile(user_id: str) -> Optional[Dict]:
+        """
+        Get user profile by ID
+        
+        Args:
+            user_id: User ID
+        
+        Returns:
+            dict: User profile data or None
+        """
+        try:
+            profile = await supabase.table("user_profiles").select("*").eq("id", user_id).single().execute()
+            return profile.data if profile.data else None
+        except Exception:
+            logger.exception("Supabase error getting profile for user %s", user_id)
+            return None
 
 
 # Dependency for protected routes
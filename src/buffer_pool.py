@@ -0,0 +1,67 @@
+"""
+Pool de buffers en memoria
+Reutiliza objetos BytesIO/StringIO entre llamadas en lugar de crear uno nuevo cada vez
+"""
+
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from queue import LifoQueue, Empty, Full
+from typing import Any, Callable
+
+
+class _BufferPool:
+    """
+    Pool LIFO de buffers reutilizables (seguro entre hilos)
+
+    Los buffers que crecieron por encima de `cap` se descartan al devolverlos
+    para no retener memoria de un archivo grande indefinidamente.
+    """
+
+    _factory: Callable[[], Any]
+
+    def __init__(self, size: int = 10, cap: int = 256 * 1024):
+        self.cap = cap
+        self._pool: LifoQueue = LifoQueue(maxsize=size)
+
+    def acquire(self):
+        """Saca un buffer vacío del pool (o crea uno si no hay)"""
+        try:
+            return self._pool.get_nowait()
+        except Empty:
+            return self._factory()
+
+    def release(self, buf) -> None:
+        """Vacía el buffer y lo devuelve al pool"""
+        size = buf.seek(0, 2)
+        buf.seek(0)
+        buf.truncate(0)
+        if size > self.cap:
+            return
+
+        try:
+            self._pool.put_nowait(buf)
+        except Full:
+            pass
+
+    @contextmanager
+    def buffer(self):
+        """Context manager: acquire() al entrar, release() al salir"""
+        buf = self.acquire()
+        try:
+            yield buf
+        finally:
+            self.release(buf)
+
+
+class ByteBufferPool(_BufferPool):
+    """Pool de BytesIO"""
+    _factory = BytesIO
+
+
+class StringBufferPool(_BufferPool):
+    """Pool de StringIO"""
+    _factory = StringIO
+
+
+BYTE_POOL = ByteBufferPool(size=10, cap=256 * 1024)
+STRING_POOL = StringBufferPool(size=10, cap=64 * 1024)
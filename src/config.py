@@ -38,10 +38,18 @@ class Config:
     - 🏢 Enterprise: Custom limits
     """
     
+    # Entorno: "dev" o "production"
+    ENV = os.getenv("ENV", "dev")
+    
     # Paths
     BASE_DIR = Path(__file__).resolve().parent.parent
     OUTPUT_AUDIO_DIR = BASE_DIR / "output_audio"
     
+    # Audio: en producción lo sirve nginx/CDN, no el worker de Python
+    # AUDIO_BASE_URL puede ser "/audio" (nginx) o una URL de CDN/Storage
+    AUDIO_BASE_URL = os.getenv("AUDIO_BASE_URL", "/audio").rstrip("/")
+    SERVE_AUDIO_FILES = os.getenv("SERVE_AUDIO_FILES", "true" if ENV == "dev" else "false").lower() == "true"
+    
     # Idiomas
     SOURCE_LANGUAGE = "en"
     SOURCE_LANGUAGE_NAME = "English (US)"
@@ -71,6 +79,16 @@ class Config:
     "http://127.0.0.1:8080",
 ]
     
+    # Rate limiting - shared storage so limits hold across workers
+    # e.g. redis://localhost:6379/0 or rediss://... (memory:// = per-process)
+    REDIS_URL = os.getenv("REDIS_URL")
+    RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", REDIS_URL or "memory://")
+    RATE_LIMIT_STRATEGY = "moving-window"
+    
+    # Cache de traducciones (usa REDIS_URL si está definido)
+    TRANSLATION_CACHE_TTL = 7 * 24 * 3600  # 7 días
+    TRANSLATION_CACHE_MAX_CHARS = 2_000_000  # caracteres en memoria sin Redis (por worker)
+    
     # Server
     HOST = "0.0.0.0"
     PORT = 8000
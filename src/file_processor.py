@@ -3,13 +3,47 @@ Procesador de archivos para extraer texto
 Soporta: TXT, PDF, DOCX, JSON, CSV, XLSX
 """
 
-import PyPDF2
-from docx import Document
+try:
+    # Extracción de PDF en C (pdfium); PyPDF2 (opcional) solo como alternativa
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+    try:
+        import PyPDF2
+    except ImportError:
+        PyPDF2 = None  # type: ignore[assignment]
+try:
+    # Parser CSV en C++ (columnar); el módulo csv queda como alternativa
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+from lxml import etree
 import openpyxl
+import asyncio
+import threading
 import json
 import csv
-from typing import Optional, Dict, Any
-from io import StringIO, BytesIO
+import os
+import orjson
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, BinaryIO, Callable, ClassVar, List, Tuple, Union
+from io import BytesIO, TextIOWrapper
+from buffer_pool import STRING_POOL
+
+# Etiquetas WordprocessingML usadas al extraer texto de DOCX
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_W_P, _W_R, _W_T = _W + 'p', _W + 'r', _W + 't'
+_W_TAB, _W_BR, _W_CR = _W + 'tab', _W + 'br', _W + 'cr'
+_MC_FALLBACK = '{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback'
+_DOCX_TAGS = (_W_P, _W_T, _W_TAB, _W_BR, _W_CR, _MC_FALLBACK)
+
+# Hilos para los parsers síncronos (pdfium/lxml/zlib liberan el GIL en C)
+_EXECUTOR = ThreadPoolExecutor(max_workers=(os.cpu_count() or 1) * 2, thread_name_prefix='file-processor')
+_PDFIUM_LOCK = threading.Lock()
 
 class FileProcessor:
     """Clase para procesar diferentes formatos de archivo"""
@@ -24,31 +58,64 @@ class FileProcessor:
         'xls': 'application/vnd.ms-excel'
     }
     
+    SUPPORTED_EXTS = frozenset(SUPPORTED_FORMATS)
+    
     MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB enough for 20000word doc
     
+    # Procesador por extensión (se rellena tras definir la clase)
+    _HANDLERS: ClassVar[Dict[str, Callable[[BinaryIO], str]]]
+    
     @staticmethod
     def get_file_extension(filename: str) -> str:
         """Obtiene la extensión del archivo"""
-        return filename.split('.')[-1].lower()
+        # rpartition busca un solo '.' desde la derecha, sin construir una lista
+        return filename.rpartition('.')[2].lower()
     
     @staticmethod
     def is_supported(filename: str) -> bool:
         """Verifica si el formato es soportado"""
-        ext = FileProcessor.get_file_extension(filename)
-        return ext in FileProcessor.SUPPORTED_FORMATS
+        return FileProcessor.get_file_extension(filename) in FileProcessor.SUPPORTED_EXTS
     
     @staticmethod
-    async def process_file(file_content: bytes, filename: str) -> Dict[str, Any]:
+    async def process_file(file_content: Union[bytes, BinaryIO], filename: str) -> Dict[str, Any]:
         """
         Procesa el archivo y extrae el texto
+        Los parsers son síncronos: se ejecutan en el pool de hilos para no bloquear el event loop
         
         Args:
-            file_content: Contenido del archivo en bytes
+            file_content: Contenido del archivo (bytes u objeto de archivo binario)
             filename: Nombre del archivo
             
         Returns:
             Dict con el texto extraído y metadata
         """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_EXECUTOR, FileProcessor._process_sync, file_content, filename)
+    
+    @staticmethod
+    async def process_batch(files: List[Tuple[Union[bytes, BinaryIO], str]],
+                            max_concurrency: int = 8) -> List[Dict[str, Any]]:
+        """
+        Procesa varios archivos en paralelo
+        
+        Args:
+            files: Lista de (contenido, nombre de archivo)
+            max_concurrency: Máximo de archivos procesándose a la vez
+            
+        Returns:
+            Lista de resultados de process_file, en el mismo orden que files
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def process_one(file_content, filename):
+            async with semaphore:
+                return await FileProcessor.process_file(file_content, filename)
+        
+        return await asyncio.gather(*(process_one(c, n) for c, n in files))
+    
+    @staticmethod
+    def _process_sync(file_content: Union[bytes, BinaryIO], filename: str) -> Dict[str, Any]:
+        """Versión síncrona de process_file"""
         ext = FileProcessor.get_file_extension(filename)
         
         if not FileProcessor.is_supported(filename):
@@ -58,38 +125,32 @@ class FileProcessor:
                 'supported_formats': list(FileProcessor.SUPPORTED_FORMATS.keys())
             }
         
-        if len(file_content) > FileProcessor.MAX_FILE_SIZE:
+        if isinstance(file_content, (bytes, bytearray)):
+            file_content = BytesIO(file_content)
+        
+        # Tamaño sin cargar el archivo en memoria
+        size_bytes = file_content.seek(0, 2)
+        file_content.seek(0)
+        
+        if size_bytes > FileProcessor.MAX_FILE_SIZE:
             return {
                 'success': False,
                 'error': f'Archivo demasiado grande. Máximo: {FileProcessor.MAX_FILE_SIZE / 1024 / 1024} MB'
             }
         
         try:
+            # El contenido real manda sobre la extensión (p. ej. un PDF llamado .txt)
+            ext = FileProcessor._sniff(file_content) or ext
+            
             # Procesar según el tipo de archivo
-            if ext == 'txt':
-                text = FileProcessor._process_txt(file_content)
-            elif ext == 'pdf':
-                text = FileProcessor._process_pdf(file_content)
-            elif ext == 'docx':
-                text = FileProcessor._process_docx(file_content)
-            elif ext == 'json':
-                text = FileProcessor._process_json(file_content)
-            elif ext == 'csv':
-                text = FileProcessor._process_csv(file_content)
-            elif ext in ['xlsx', 'xls']:
-                text = FileProcessor._process_xlsx(file_content)
-            else:
-                return {
-                    'success': False,
-                    'error': f'Procesador no implementado para: {ext}'
-                }
+            text = FileProcessor._HANDLERS[ext](file_content)
             
             return {
                 'success': True,
                 'text': text,
                 'filename': filename,
                 'format': ext,
-                'size_bytes': len(file_content),
+                'size_bytes': size_bytes,
                 'char_count': len(text)
             }
             
@@ -101,15 +162,65 @@ class FileProcessor:
             }
     
     @staticmethod
-    def _process_txt(content: bytes) -> str:
+    def _sniff(file_content: BinaryIO) -> Optional[str]:
+        """
+        Detecta formatos binarios por sus magic bytes
+        
+        Returns:
+            Extensión detectada, o None si hay que confiar en el nombre
+        """
+        header = file_content.read(4)
+        file_content.seek(0)
+        
+        if header == b'%PDF':
+            return 'pdf'
+        
+        if header == b'PK\x03\x04':
+            # DOCX y XLSX son zip: se distinguen por su contenido
+            try:
+                with zipfile.ZipFile(file_content) as archive:
+                    names = set(archive.namelist())
+            except zipfile.BadZipFile:
+                return None
+            finally:
+                file_content.seek(0)
+            
+            if 'word/document.xml' in names:
+                return 'docx'
+            if 'xl/workbook.xml' in names:
+                return 'xlsx'
+        
+        return None
+    
+    @staticmethod
+    def _process_txt(content: BinaryIO) -> str:
         """Procesa archivos TXT"""
-        return content.decode('utf-8', errors='ignore').strip()
+        return content.read().decode('utf-8', errors='ignore').strip()
+    
+    @staticmethod
+    def _process_pdf(content: BinaryIO) -> str:
+        """Procesa archivos PDF (pdfium, extracción en C página a página)"""
+        if pdfium is None:
+            if PyPDF2 is None:
+                raise RuntimeError('Soporte PDF no instalado (pip install pypdfium2)')
+            return FileProcessor._process_pdf_pypdf2(content)
+        
+        # pdfium no es thread-safe: un solo documento a la vez por proceso
+        with _PDFIUM_LOCK, STRING_POOL.buffer() as text, pdfium.PdfDocument(content) as pdf:
+            for page in pdf:
+                # Liberar cada página al terminar para mantener acotada la memoria
+                textpage = page.get_textpage()
+                text.write(textpage.get_text_range().replace('\r\n', '\n'))
+                text.write('\n\n')
+                textpage.close()
+                page.close()
+            
+            return text.getvalue().strip()
     
     @staticmethod
-    def _process_pdf(content: bytes) -> str:
-        """Procesa archivos PDF"""
-        pdf_file = BytesIO(content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
+    def _process_pdf_pypdf2(content: BinaryIO) -> str:
+        """Procesa archivos PDF con PyPDF2 (Python puro, más lento)"""
+        pdf_reader = PyPDF2.PdfReader(content)
         
         text_parts = []
         for page in pdf_reader.pages:
@@ -118,69 +229,184 @@ class FileProcessor:
         return '\n\n'.join(text_parts).strip()
     
     @staticmethod
-    def _process_docx(content: bytes) -> str:
-        """Procesa archivos DOCX"""
-        docx_file = BytesIO(content)
-        doc = Document(docx_file)
+    def _process_docx(content: BinaryIO) -> str:
+        """Procesa archivos DOCX - lee word/document.xml en streaming"""
+        text_parts: List[str] = []
+        current: List[str] = []
+        depth = 0  # párrafos abiertos (>1 dentro de un cuadro de texto)
+        fallback = 0  # dentro de mc:Fallback (copia alternativa del contenido)
         
-        text_parts = []
-        for paragraph in doc.paragraphs:
-            if paragraph.text.strip():
-                text_parts.append(paragraph.text)
+        with zipfile.ZipFile(content) as archive, archive.open('word/document.xml') as document:
+            for event, element in etree.iterparse(document, events=('start', 'end'), tag=_DOCX_TAGS):
+                tag = element.tag
+                if tag == _MC_FALLBACK:
+                    fallback += 1 if event == 'start' else -1
+                    continue
+                if fallback:
+                    continue
+                
+                if tag == _W_P:
+                    if event == 'start':
+                        depth += 1
+                        continue
+                    depth -= 1
+                    if depth:
+                        # Párrafo de un cuadro de texto: sigue el párrafo que lo contiene
+                        if current and current[-1] != '\n':
+                            current.append('\n')
+                        continue
+                elif event == 'start':
+                    continue
+                elif tag == _W_T:
+                    if element.text:
+                        current.append(element.text)
+                    continue
+                else:
+                    # Tabulaciones y saltos dentro de un run (no las de w:pPr/w:tabs)
+                    if element.getparent().tag == _W_R:
+                        current.append('\t' if tag == _W_TAB else '\n')
+                    continue
+                
+                # Fin de párrafo
+                paragraph = ''.join(current)
+                if paragraph.strip():
+                    text_parts.append(paragraph)
+                current.clear()
+                
+                # Liberar los nodos ya procesados
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
         
         return '\n\n'.join(text_parts).strip()
     
     @staticmethod
-    def _process_json(content: bytes) -> str:
+    def _process_json(content: BinaryIO) -> str:
         """Procesa archivos JSON - extrae todos los valores de texto"""
-        json_str = content.decode('utf-8', errors='ignore')
-        data = json.loads(json_str)
-        
-        def extract_text(obj):
-            """Extrae recursivamente todo el texto del JSON"""
-            texts = []
-            if isinstance(obj, dict):
-                for value in obj.values():
-                    texts.extend(extract_text(value))
-            elif isinstance(obj, list):
-                for item in obj:
-                    texts.extend(extract_text(item))
-            elif isinstance(obj, str):
+        json_str = content.read().decode('utf-8', errors='ignore')
+        try:
+            data = orjson.loads(json_str)
+        except ValueError:
+            # orjson es más estricto (NaN, enteros > 64 bits): usar json estándar
+            data = json.loads(json_str)
+        
+        # Recorrido iterativo con pila (sin límite de recursión), en orden del documento
+        texts = []
+        stack = deque([data])
+        while stack:
+            obj = stack.pop()
+            obj_type = type(obj)
+            if obj_type is dict:
+                stack.extend(reversed(obj.values()))
+            elif obj_type is list:
+                stack.extend(reversed(obj))
+            elif obj_type is str:
                 texts.append(obj)
-            return texts
         
-        all_texts = extract_text(data)
-        return '\n'.join(all_texts).strip()
+        return '\n'.join(texts).strip()
     
     @staticmethod
-    def _process_csv(content: bytes) -> str:
+    def _process_csv(content: BinaryIO) -> str:
         """Procesa archivos CSV - extrae todas las celdas"""
-        csv_str = content.decode('utf-8', errors='ignore')
-        csv_file = StringIO(csv_str)
+        if pa is not None:
+            try:
+                return FileProcessor._process_csv_arrow(content)
+            except pa.ArrowInvalid:
+                # Filas con distinto número de columnas, UTF-8 inválido o archivo vacío
+                content.seek(0)
+        
+        return FileProcessor._process_csv_stdlib(content)
+    
+    @staticmethod
+    def _process_csv_arrow(content: BinaryIO) -> str:
+        """Procesa archivos CSV con pyarrow (parser en C++, libera el GIL)"""
+        # La primera fila también es contenido, no cabecera
+        read_options = pacsv.ReadOptions(autogenerate_column_names=True)
+        parse_options = pacsv.ParseOptions(newlines_in_values=True)
+        
+        # Leer el primer bloque para saber cuántas columnas hay y forzarlas
+        # todas a texto (sin inferencia: "007" no debe convertirse en 7)
+        with pacsv.open_csv(content, read_options=read_options, parse_options=parse_options) as reader:
+            column_names = reader.schema.names
+        content.seek(0)
+        
+        table = pacsv.read_csv(
+            content,
+            read_options=read_options,
+            parse_options=parse_options,
+            convert_options=pacsv.ConvertOptions(column_types=dict.fromkeys(column_names, pa.string()))
+        )
+        
+        if table.num_rows == 0:
+            return ''
+        
+        # Todo en C, columna a columna: strip, celdas vacías → null,
+        # unir cada fila saltando nulls y descartar filas vacías
+        columns = []
+        for column in table.columns:
+            column = pc.utf8_trim_whitespace(column)
+            columns.append(pc.if_else(pc.equal(column, ''), None, column))
+        rows = pc.binary_join_element_wise(*columns, ' | ', null_handling='skip')
+        rows = pc.filter(rows, pc.not_equal(rows, ''))
+        
+        return '\n'.join(rows.to_pylist()).strip()
+    
+    @staticmethod
+    def _process_csv_stdlib(content: BinaryIO) -> str:
+        """Procesa archivos CSV con el módulo csv (Python puro, más lento)"""
+        # Decodifica por bloques en lugar de cargar todo el archivo como str
+        csv_file = TextIOWrapper(content, encoding='utf-8', errors='ignore', newline='')
         reader = csv.reader(csv_file)
         
         text_parts = []
-        for row in reader:
-            row_text = ' | '.join(cell.strip() for cell in row if cell.strip())
-            if row_text:
-                text_parts.append(row_text)
+        try:
+            for row in reader:
+                # strip una sola vez por celda
+                cells = [cell for cell in map(str.strip, row) if cell]
+                if cells:
+                    text_parts.append(' | '.join(cells))
+        finally:
+            # Devolver el archivo original sin cerrarlo
+            csv_file.detach()
         
         return '\n'.join(text_parts).strip()
     
     @staticmethod
-    def _process_xlsx(content: bytes) -> str:
+    def _process_xlsx(content: BinaryIO) -> str:
         """Procesa archivos XLSX - extrae todas las celdas"""
-        xlsx_file = BytesIO(content)
-        workbook = openpyxl.load_workbook(xlsx_file, data_only=True)
+        # read_only: las filas se leen en streaming sin construir el grafo de celdas
+        workbook = openpyxl.load_workbook(content, data_only=True, read_only=True)
         
         text_parts = []
-        for sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            text_parts.append(f"=== {sheet_name} ===")
-            
-            for row in sheet.iter_rows(values_only=True):
-                row_text = ' | '.join(str(cell).strip() for cell in row if cell is not None and str(cell).strip())
-                if row_text:
-                    text_parts.append(row_text)
+        try:
+            for sheet_name in workbook.sheetnames:
+                sheet = workbook[sheet_name]
+                text_parts.append(f"=== {sheet_name} ===")
+                
+                for row in sheet.iter_rows(values_only=True):
+                    cells = []
+                    for cell in row:
+                        if cell is None:
+                            continue
+                        cell_text = (cell if type(cell) is str else str(cell)).strip()
+                        if cell_text:
+                            cells.append(cell_text)
+                    if cells:
+                        text_parts.append(' | '.join(cells))
+        finally:
+            # En modo read_only hay que cerrar para liberar el archivo zip
+            workbook.close()
         
-        return '\n'.join(text_parts).strip()
\ No newline at end of file
+        return '\n'.join(text_parts).strip()
+
+
+# Procesador por extensión (todas las de SUPPORTED_FORMATS)
+FileProcessor._HANDLERS = {
+    'txt': FileProcessor._process_txt,
+    'pdf': FileProcessor._process_pdf,
+    'docx': FileProcessor._process_docx,
+    'json': FileProcessor._process_json,
+    'csv': FileProcessor._process_csv,
+    'xlsx': FileProcessor._process_xlsx,
+    'xls': FileProcessor._process_xlsx
+}
@@ -4,7 +4,7 @@ Text translation and text-to-speech generation
 
 Source: English-US → Target: 9 languages (including English)
 
-Requirements: pip install gtts deep-translator pydub
+Requirements: pip install gtts deep-translator
 
 DATA SOURCES:
 - Translation: Google Translate API (via deep-translator)
@@ -13,12 +13,105 @@ DATA SOURCES:
 """
 
 from gtts import gTTS
+from cachetools import LRUCache
 from deep_translator import GoogleTranslator
+from deep_translator import google as google_backend
+from requests.adapters import HTTPAdapter
+from buffer_pool import BYTE_POOL
+import numpy as np
+import requests
+import threading
+import hashlib
+import asyncio
+import re
 import os
 from datetime import datetime
+from typing import AsyncIterator, List
+
+MAX_CHUNK_SIZE = 4500  # Google Translate limit
+MAX_TTS_SIZE = 4999  # gTTS limit
+MAX_CONCURRENCY = 5  # Simultaneous requests to Google services
+CHUNK_CACHE_MAX_CHARS = 2_000_000  # Translated characters kept in memory
+
+# Sentence boundary for TTS: a period followed by whitespace or the end of text
+_SENTENCE_SPLIT = re.compile(r'\.(?:\s+|$)')
+
+# deep-translator calls requests.get() directly, opening a new TCP/TLS
+# connection per chunk. Route it through one pooled Session instead so
+# keep-alive connections are reused across requests
+_http_session = requests.Session()
+_http_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64)
+_http_session.mount('https://', _http_adapter)
+_http_session.mount('http://', _http_adapter)
+google_backend.requests = _http_session
+
+
+def _pack_chunks(parts: List[str], limit: int, sep: str) -> List[str]:
+    """
+    Greedily packs consecutive parts into chunks of at most limit characters
+    A part longer than limit on its own becomes a chunk by itself
+    
+    Args:
+        parts (list): Strings to pack, in order
+        limit (int): Maximum characters per chunk (separators included)
+        sep (str): Separator used to join the parts of a chunk
+    
+    Returns:
+        list: Joined chunks
+    """
+    seplen = len(sep)
+    
+    # bounds[i] = length of sep.join(parts[:i]) + sep, so a chunk spanning
+    # parts[start:end] has length bounds[end] - bounds[start] - seplen
+    bounds = np.zeros(len(parts) + 1, dtype=np.int64)
+    lengths = np.fromiter((len(p) for p in parts), dtype=np.int64, count=len(parts))
+    np.cumsum(lengths + seplen, out=bounds[1:])
+    
+    chunks = []
+    start = 0
+    while start < len(parts):
+        end = int(np.searchsorted(bounds, bounds[start] + limit + seplen, side='right')) - 1
+        end = max(end, start + 1)
+        chunks.append(sep.join(parts[start:end]))
+        start = end
+    
+    return chunks
+
+
+# GoogleTranslator keeps request params on the instance, so instances are
+# cached per thread (one per language pair) rather than shared
+_translators = threading.local()
+
+
+def _translator(source: str, target: str) -> GoogleTranslator:
+    """Returns this thread's GoogleTranslator for a language pair"""
+    try:
+        cache = _translators.by_pair
+    except AttributeError:
+        cache = _translators.by_pair = {}
+    
+    translator = cache.get((source, target))
+    if translator is None:
+        translator = cache[(source, target)] = GoogleTranslator(source=source, target=target)
+    return translator
+
+
+# Repeated chunks (same phrase, same language) are served from memory
+# Keyed by (language, digest) so the cache doesn't hold the source text
+_chunk_cache = LRUCache(maxsize=CHUNK_CACHE_MAX_CHARS, getsizeof=len)
+_chunk_cache_lock = threading.Lock()
+
+
+class TranslationError(Exception):
+    """Raised when a translation request fails"""
+
+
+class TTSError(Exception):
+    """Raised when audio generation fails"""
+
 
 class LocalizationAI:
-    def __init__(self):
+    def __init__(self) -> None:
         # Source language is always English-US
         self.source_language = 'en'
         
@@ -39,7 +132,48 @@ class LocalizationAI:
         print(f"  Source language: English (US)")
         print(f"  Target languages: {len(self.target_languages)}")
         
-    def translate_text(self, text, target_lang):
+    def _split_translation_chunks(self, text: str, max_chunk_size: int) -> List[str]:
+        """
+        Splits text into chunks of at most max_chunk_size characters
+        Paragraphs are kept together; oversized paragraphs are split by sentences
+        
+        Args:
+            text (str): Text to split
+            max_chunk_size (int): Maximum characters per chunk
+        
+        Returns:
+            list: Text chunks
+        """
+        # Split by paragraphs first (to maintain context)
+        paragraphs = text.split('\n\n')
+        lengths = np.fromiter((len(p) for p in paragraphs), dtype=np.int64, count=len(paragraphs))
+        
+        # Paragraphs that fit are packed together; oversized ones are split by sentences
+        chunks = []
+        start = 0
+        for stop in np.flatnonzero(lengths > max_chunk_size).tolist():
+            chunks.extend(_pack_chunks(paragraphs[start:stop], max_chunk_size, '\n\n'))
+            sentences = [sentence.strip() for sentence in paragraphs[stop].split('. ')]
+            chunks.extend(_pack_chunks([s for s in sentences if s], max_chunk_size, '. '))
+            start = stop + 1
+        chunks.extend(_pack_chunks(paragraphs[start:], max_chunk_size, '\n\n'))
+        
+        return chunks
+    
+    def _translate_chunk(self, chunk: str, target_lang: str) -> str:
+        """Translates a single chunk, using the chunk cache (thread-safe)"""
+        key = (target_lang, hashlib.blake2b(chunk.encode('utf-8'), digest_size=16).digest())
+        with _chunk_cache_lock:
+            translated = _chunk_cache.get(key)
+        
+        if translated is None:
+            translated = _translator(self.source_language, target_lang).translate(chunk)
+            if translated:
+                with _chunk_cache_lock:
+                    _chunk_cache[key] = translated
+        return translated
+    
+    def translate_text(self, text: str, target_lang: str) -> str:
         """
         Translates text from English-US to target language
         If text is too long (>4500 chars), it splits into chunks
@@ -50,88 +184,117 @@ class LocalizationAI:
         
         Returns:
             str: Translated text
+        
+        Raises:
+            TranslationError: If the translation service fails
+        """
+        # If target is same as source (en → en), return original text
+        if target_lang == self.source_language:
+            return text
+        
+        translate = self._translate_short if len(text) <= MAX_CHUNK_SIZE else self._translate_long
+        try:
+            return translate(text, target_lang)
+        except Exception as e:
+            raise TranslationError(f"Translation error: {str(e)}") from e
+    
+    def _translate_short(self, text: str, target_lang: str) -> str:
+        """Translates text that fits in a single request"""
+        return self._translate_chunk(text, target_lang)
+    
+    def _translate_long(self, text: str, target_lang: str) -> str:
+        """Translates text longer than MAX_CHUNK_SIZE chunk by chunk"""
+        print(f"  ⚠️  Long text ({len(text)} chars), splitting into chunks...")
+        chunks = self._split_translation_chunks(text, MAX_CHUNK_SIZE)
+        print(f"  📦 Split into {len(chunks)} chunks")
+        
+        # Translate each chunk
+        translated_chunks = []
+        
+        for i, chunk in enumerate(chunks, 1):
+            print(f"  🔄 Translating chunk {i}/{len(chunks)} ({len(chunk)} chars)...")
+            translated = self._translate_chunk(chunk, target_lang)
+            translated_chunks.append(translated)
+        
+        # Join all translated chunks
+        full_translation = '\n\n'.join(translated_chunks)
+        print(f"  ✅ Translation complete: {len(full_translation)} chars")
+        
+        return full_translation
+    
+    async def translate_text_async(self, text: str, target_lang: str,
+                                   max_concurrency: int = MAX_CONCURRENCY) -> str:
+        """
+        Async version of translate_text
+        Chunks are translated concurrently (at most max_concurrency at a time)
+        
+        Args:
+            text (str): English text to translate
+            target_lang (str): Target language code (es, fr, de, etc.)
+            max_concurrency (int): Maximum simultaneous requests to Google Translate
+        
+        Returns:
+            str: Translated text
+        
+        Raises:
+            TranslationError: If the translation service fails
         """
-        MAX_CHUNK_SIZE = 4500  # Google Translate limit
+        # If target is same as source (en → en), return original text
+        if target_lang == self.source_language:
+            return text
         
         try:
-            # If text is short, translate directly
             if len(text) <= MAX_CHUNK_SIZE:
-                # If target is same as source (en → en), return original text
-                if target_lang == self.source_language:
-                    return text
-                
-                translator = GoogleTranslator(source=self.source_language, target=target_lang)
-                return translator.translate(text)
-            
-            # If text is long, split into chunks
-            print(f"  ⚠️  Long text ({len(text)} chars), splitting into chunks...")
-            
-            # Split by paragraphs first (to maintain context)
-            paragraphs = text.split('\n\n')
-            chunks = []
-            current_chunk = []
-            current_length = 0
+                chunks = [text]
+            else:
+                chunks = self._split_translation_chunks(text, MAX_CHUNK_SIZE)
             
-            for paragraph in paragraphs:
-                paragraph_length = len(paragraph)
-                
-                # If a single paragraph is too long, split by sentences
-                if paragraph_length > MAX_CHUNK_SIZE:
-                    sentences = paragraph.split('. ')
-                    for sentence in sentences:
-                        sentence = sentence.strip()
-                        if not sentence:
-                            continue
-                        
-                        if current_length + len(sentence) + 2 > MAX_CHUNK_SIZE:
-                            if current_chunk:
-                                chunks.append(' '.join(current_chunk))
-                            current_chunk = [sentence]
-                            current_length = len(sentence)
-                        else:
-                            current_chunk.append(sentence)
-                            current_length += len(sentence) + 2
-                else:
-                    # Add complete paragraph if it fits
-                    if current_length + paragraph_length + 2 > MAX_CHUNK_SIZE:
-                        if current_chunk:
-                            chunks.append('\n\n'.join(current_chunk))
-                        current_chunk = [paragraph]
-                        current_length = paragraph_length
-                    else:
-                        current_chunk.append(paragraph)
-                        current_length += paragraph_length + 2
+            loop = asyncio.get_running_loop()
+            semaphore = asyncio.Semaphore(max_concurrency)
             
-            # Add last chunk
-            if current_chunk:
-                chunks.append('\n\n'.join(current_chunk))
+            async def translate_chunk(chunk: str) -> str:
+                async with semaphore:
+                    return await loop.run_in_executor(None, self._translate_chunk, chunk, target_lang)
             
-            print(f"  📦 Split into {len(chunks)} chunks")
-            
-            # If target is same as source (en → en), return original chunks
-            if target_lang == self.source_language:
-                print(f"  ℹ️  Target language is same as source, returning original text")
-                return text
-            
-            # Translate each chunk
-            translator = GoogleTranslator(source=self.source_language, target=target_lang)
-            translated_chunks = []
-            
-            for i, chunk in enumerate(chunks, 1):
-                print(f"  🔄 Translating chunk {i}/{len(chunks)} ({len(chunk)} chars)...")
-                translated = translator.translate(chunk)
-                translated_chunks.append(translated)
-            
-            # Join all translated chunks
-            full_translation = '\n\n'.join(translated_chunks)
-            print(f"  ✅ Translation complete: {len(full_translation)} chars")
-            
-            return full_translation
+            translated_chunks = await asyncio.gather(*(translate_chunk(c) for c in chunks))
+            return '\n\n'.join(translated_chunks)
             
         except Exception as e:
-            return f"Translation error: {str(e)}"
+            raise TranslationError(f"Translation error: {str(e)}") from e
+    
+    def _split_tts_chunks(self, text: str, max_chunk_size: int) -> List[str]:
+        """
+        Splits text by sentences into chunks of at most max_chunk_size characters
+        
+        Args:
+            text (str): Text to split
+            max_chunk_size (int): Maximum characters per chunk
+        
+        Returns:
+            list: Text chunks
+        """
+        # Split by sentences
+        sentences = _SENTENCE_SPLIT.split(text)
+        sentences = [sentence for sentence in map(str.strip, sentences) if sentence]
+        
+        # Leave room for the closing period added to each chunk
+        return [chunk + '.' for chunk in _pack_chunks(sentences, max_chunk_size - 1, '. ')]
+    
+    @staticmethod
+    def _audio_filename(lang: str, output_dir: str) -> str:
+        """Creates the output folder and returns a unique MP3 path"""
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        return os.path.join(output_dir, f"audio_{lang}_{timestamp}.mp3")
     
-    def text_to_speech(self, text, lang, output_dir='output_audio'):
+    @staticmethod
+    def _synthesize_chunk(chunk: str, lang: str) -> bytes:
+        """Generates MP3 bytes for a single chunk"""
+        with BYTE_POOL.buffer() as buffer:
+            gTTS(text=chunk, lang=lang, slow=False).write_to_fp(buffer)
+            return buffer.getvalue()
+    
+    def text_to_speech(self, text: str, lang: str, output_dir: str = 'output_audio') -> str:
         """
         Converts text to MP3 audio using Google TTS
         If text is too long (>4999 chars), it splits into chunks and combines them
@@ -143,16 +306,12 @@ class LocalizationAI:
         
         Returns:
             str: Path to generated file
-        """
-        MAX_TTS_SIZE = 4999  # gTTS limit
         
+        Raises:
+            TTSError: If audio generation fails
+        """
         try:
-            # Create folder if it doesn't exist
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Generate unique filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = os.path.join(output_dir, f"audio_{lang}_{timestamp}.mp3")
+            filename = self._audio_filename(lang, output_dir)
             
             # If text is short, generate directly
             if len(text) <= MAX_TTS_SIZE:
@@ -163,69 +322,108 @@ class LocalizationAI:
             
             # If text is long, split and combine
             print(f"  ⚠️  Long text for TTS ({len(text)} chars), splitting...")
+            chunks = self._split_tts_chunks(text, MAX_TTS_SIZE)
+            print(f"  📦 Split into {len(chunks)} audio chunks")
             
-            try:
-                from pydub import AudioSegment
-            except ImportError:
-                print("  ⚠️  pydub not installed. Truncating text to 4999 chars...")
-                text = text[:MAX_TTS_SIZE]
-                tts = gTTS(text=text, lang=lang, slow=False)
-                tts.save(filename)
-                print(f"  ✓ Audio generated (truncated): {filename}")
-                return filename
+            # MP3 frames are self-delimiting: chunks are concatenated as bytes
+            with open(filename, 'wb') as f:
+                for i, chunk in enumerate(chunks, 1):
+                    print(f"  🎵 Generating audio chunk {i}/{len(chunks)}...")
+                    f.write(self._synthesize_chunk(chunk, lang))
             
-            # Split by sentences
-            sentences = text.replace('.\n', '. ').replace('.\r', '. ').split('. ')
-            chunks = []
-            current_chunk = []
-            current_length = 0
+            print(f"  ✓ Complete audio generated: {filename}")
+            return filename
             
-            for sentence in sentences:
-                sentence = sentence.strip()
-                if not sentence:
-                    continue
-                
-                sentence_length = len(sentence)
-                
-                if current_length + sentence_length + 2 > MAX_TTS_SIZE:
-                    if current_chunk:
-                        chunks.append('. '.join(current_chunk) + '.')
-                    current_chunk = [sentence]
-                    current_length = sentence_length
-                else:
-                    current_chunk.append(sentence)
-                    current_length += sentence_length + 2
+        except Exception as e:
+            raise TTSError(f"TTS error: {str(e)}") from e
+    
+    async def text_to_speech_async(self, text: str, lang: str, output_dir: str = 'output_audio',
+                                   max_concurrency: int = MAX_CONCURRENCY) -> str:
+        """
+        Async version of text_to_speech
+        Chunks are synthesized concurrently (at most max_concurrency at a time)
+        and written in order
+        
+        Args:
+            text (str): Text to convert to audio
+            lang (str): Language code for voice
+            output_dir (str): Folder where to save audio
+            max_concurrency (int): Maximum simultaneous requests to Google TTS
+        
+        Returns:
+            str: Path to generated file
+        
+        Raises:
+            TTSError: If audio generation fails
+        """
+        try:
+            filename = self._audio_filename(lang, output_dir)
             
-            if current_chunk:
-                chunks.append('. '.join(current_chunk) + '.')
+            if len(text) <= MAX_TTS_SIZE:
+                chunks = [text]
+            else:
+                chunks = self._split_tts_chunks(text, MAX_TTS_SIZE)
             
-            print(f"  📦 Split into {len(chunks)} audio chunks")
+            loop = asyncio.get_running_loop()
+            semaphore = asyncio.Semaphore(max_concurrency)
             
-            # Generate audio for each chunk
-            combined = AudioSegment.empty()
+            async def synthesize(chunk: str) -> bytes:
+                async with semaphore:
+                    return await loop.run_in_executor(None, self._synthesize_chunk, chunk, lang)
             
-            for i, chunk in enumerate(chunks, 1):
-                print(f"  🎵 Generating audio chunk {i}/{len(chunks)}...")
-                temp_filename = os.path.join(output_dir, f"temp_{lang}_{timestamp}_{i}.mp3")
-                tts = gTTS(text=chunk, lang=lang, slow=False)
-                tts.save(temp_filename)
-                
-                # Load and combine
-                audio_chunk = AudioSegment.from_mp3(temp_filename)
-                combined += audio_chunk
-                
-                # Remove temporary file
-                os.remove(temp_filename)
+            audio_chunks = await asyncio.gather(*(synthesize(c) for c in chunks))
             
-            # Save combined audio
-            combined.export(filename, format="mp3")
-            print(f"  ✓ Complete audio generated: {filename}")
+            with open(filename, 'wb') as f:
+                f.write(b''.join(audio_chunks))
             
             return filename
             
         except Exception as e:
-            return f"TTS error: {str(e)}"
-
+            raise TTSError(f"TTS error: {str(e)}") from e
+    
+    async def text_to_speech_stream(self, text: str, lang: str,
+                                    max_concurrency: int = MAX_CONCURRENCY) -> AsyncIterator[bytes]:
+        """
+        Streaming version of text_to_speech_async
+        Yields the MP3 bytes of each chunk in order as soon as it is ready,
+        without writing to disk (MP3 frames concatenate cleanly)
+        
+        Args:
+            text (str): Text to convert to audio
+            lang (str): Language code for voice
+            max_concurrency (int): Maximum simultaneous requests to Google TTS
+        
+        Yields:
+            bytes: MP3 audio of one chunk
+        
+        Raises:
+            TTSError: If audio generation fails
+        """
+        if len(text) <= MAX_TTS_SIZE:
+            chunks = [text]
+        else:
+            chunks = self._split_tts_chunks(text, MAX_TTS_SIZE)
+        
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def synthesize(chunk: str) -> bytes:
+            async with semaphore:
+                return await loop.run_in_executor(None, self._synthesize_chunk, chunk, lang)
+        
+        # Later chunks are synthesized while earlier ones are being sent
+        tasks = [asyncio.ensure_future(synthesize(c)) for c in chunks]
+        try:
+            for task in tasks:
+                try:
+                    audio = await task
+                except Exception as e:
+                    raise TTSError(f"TTS error: {str(e)}") from e
+                yield audio
+        finally:
+            # Client disconnected or a chunk failed: drop pending work
+            for task in tasks:
+                task.cancel()
 
 # Example usage for testing
 if __name__ == "__main__":
@@ -1,12 +1,19 @@
 """
 Modelos de datos para la API de Localización
 Usa Pydantic para validación automática
+
+Los modelos *Request validan la entrada. Los modelos *Response documentan
+el esquema (OpenAPI); los endpoints los construyen sin validación
+(model_construct o dicts en ORJSONResponse) porque los datos ya los genera
+la propia API.
 """
 
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from enum import Enum
 
+from config import Config
+
 class TargetLanguage(str, Enum):
     """Supported target languages"""
     ENGLISH = "en"
@@ -25,7 +32,7 @@ class TargetLanguage(str, Enum):
 
 class TranslateRequest(BaseModel):
     """Request for text translation"""
-    text: str = Field(..., min_length=1, max_length=20000, description="English text to translate")
+    text: str = Field(..., min_length=Config.MIN_TEXT_LENGTH, max_length=Config.MAX_TEXT_LENGTH, description="English text to translate")
     target_language: TargetLanguage = Field(..., description="Target language code")
     
     class Config:
@@ -50,7 +57,7 @@ class TranslateResponse(BaseModel):
 
 class TTSRequest(BaseModel):
     """Request for text-to-speech with translation"""
-    text: str = Field(..., min_length=1, max_length=20000, description="English text to translate and convert to audio")
+    text: str = Field(..., min_length=Config.MIN_TEXT_LENGTH, max_length=Config.MAX_TEXT_LENGTH, description="English text to translate and convert to audio")
     target_language: TargetLanguage = Field(..., description="Target language for translation and audio")
     
     class Config:
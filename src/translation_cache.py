@@ -0,0 +1,95 @@
+"""
+Cache de traducciones
+Evita repetir llamadas a Google Translate para el mismo (idioma, texto)
+"""
+
+from functools import wraps
+from typing import Awaitable, Callable, Optional
+from cachetools import TTLCache
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationCache:
+    """
+    Exact-match cache for translations
+
+    Uses Redis when a URL is configured (shared across workers),
+    otherwise an in-process TTL cache bounded by total characters stored
+    (a single entry can be a 20,000-char translation).
+    """
+
+    KEY_PREFIX = "translation:"
+
+    def __init__(self, redis_url: Optional[str] = None, ttl: int = 7 * 24 * 3600,
+                 max_chars: int = 2_000_000):
+        self.ttl = ttl
+        self._redis = None
+        self._local: TTLCache = TTLCache(maxsize=max_chars, ttl=ttl, getsizeof=len)
+
+        if redis_url:
+            try:
+                from redis import asyncio as aioredis
+                self._redis = aioredis.Redis.from_url(redis_url)
+            except Exception as e:
+                logger.warning("Translation cache falling back to memory: %s", e)
+
+    @staticmethod
+    def make_key(text: str, target_lang: str) -> str:
+        """Build the cache key for a (language, text) pair"""
+        digest = hashlib.blake2b(f"{target_lang}\x00{text}".encode(), digest_size=16).hexdigest()
+        return f"{TranslationCache.KEY_PREFIX}{digest}"
+
+    async def get(self, text: str, target_lang: str) -> Optional[str]:
+        """Return the cached translation, or None on a miss"""
+        key = self.make_key(text, target_lang)
+        if self._redis is None:
+            return self._local.get(key)
+
+        try:
+            value = await self._redis.get(key)
+        except Exception as e:
+            logger.warning("Translation cache read failed: %s", e)
+            return None
+        return value.decode("utf-8") if value is not None else None
+
+    async def set(self, text: str, target_lang: str, translated: str) -> None:
+        """Store a translation"""
+        key = self.make_key(text, target_lang)
+        if self._redis is None:
+            try:
+                self._local[key] = translated
+            except ValueError:
+                # Larger than the whole cache budget: not cached
+                pass
+            return
+
+        try:
+            await self._redis.set(key, translated.encode("utf-8"), ex=self.ttl)
+        except Exception as e:
+            logger.warning("Translation cache write failed: %s", e)
+
+
+def cached_translation(cache: TranslationCache, source_lang: Optional[str] = None) -> Callable:
+    """
+    Decorator for async translate(text, target_lang) functions
+
+    Hits return the stored translation without calling the wrapped function;
+    failures (exceptions) are never cached. Calls with target_lang equal to
+    source_lang bypass the cache (the "translation" is the input itself).
+    """
+    def decorator(func: Callable[[str, str], Awaitable[str]]) -> Callable[[str, str], Awaitable[str]]:
+        @wraps(func)
+        async def wrapper(text: str, target_lang: str) -> str:
+            if target_lang == source_lang:
+                return await func(text, target_lang)
+
+            translated = await cache.get(text, target_lang)
+            if translated is None:
+                translated = await func(text, target_lang)
+                await cache.set(text, target_lang, translated)
+            return translated
+        return wrapper
+    return decorator
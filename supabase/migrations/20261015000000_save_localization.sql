@@ -0,0 +1,38 @@
+-- Saves a translation and its generated audio in a single round trip.
+-- Called from the API via supabase.rpc('save_localization', {...}).
+create or replace function public.save_localization(
+    p_user_id uuid,
+    p_source_text text,
+    p_translated_text text,
+    p_source_language text,
+    p_target_language text,
+    p_char_count integer,
+    p_audio_file_path text,
+    p_audio_url text,
+    p_file_name text default null,
+    p_file_format text default null
+)
+returns uuid
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_translation_id uuid;
+begin
+    insert into translations (
+        user_id, source_text, translated_text, source_language,
+        target_language, char_count, file_name, file_format
+    )
+    values (
+        p_user_id, p_source_text, p_translated_text, p_source_language,
+        p_target_language, p_char_count, p_file_name, p_file_format
+    )
+    returning id into v_translation_id;
+
+    insert into localizations (user_id, translation_id, audio_file_path, audio_url)
+    values (p_user_id, v_translation_id, p_audio_file_path, p_audio_url);
+
+    return v_translation_id;
+end;
+$$;
@@ -0,0 +1,33 @@
+-- Deducts credits and opens a pending usage log in a single round trip.
+-- The API later closes the log with an UPDATE (see AuthService.finalize_usage).
+-- Returns ok = false (and no log row) when the user lacks credits.
+create or replace function public.reserve_and_log(
+    p_user_id uuid,
+    p_action_type text,
+    p_char_count integer,
+    p_target_languages text[],
+    p_credits_needed integer default 1
+)
+returns table (ok boolean, log_id uuid)
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if not check_and_deduct_credits(p_user_id, p_credits_needed) then
+        return query select false, null::uuid;
+        return;
+    end if;
+
+    return query
+    insert into usage_logs (
+        user_id, action_type, char_count, target_languages,
+        credits_used, success, error_message
+    )
+    values (
+        p_user_id, p_action_type, p_char_count, p_target_languages,
+        p_credits_needed, false, 'pending'
+    )
+    returning true, id;
+end;
+$$;
@@ -0,0 +1,7 @@
+-- reserve_and_log is security definer and trusts p_user_id, so it must not be
+-- callable with the public anon key (or a user JWT) through /rest/v1/rpc.
+-- Only the API, using the service-role key, may reserve credits.
+revoke execute on function public.reserve_and_log(uuid, text, integer, text[], integer)
+    from public, anon, authenticated;
+grant execute on function public.reserve_and_log(uuid, text, integer, text[], integer)
+    to service_role;
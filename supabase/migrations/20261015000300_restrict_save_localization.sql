@@ -0,0 +1,7 @@
+-- save_localization is security definer and trusts p_user_id / p_audio_url,
+-- so it must not be callable with the public anon key (or a user JWT)
+-- through /rest/v1/rpc. Only the API, using the service-role key, may save.
+revoke execute on function public.save_localization(uuid, text, text, text, text, integer, text, text, text, text)
+    from public, anon, authenticated;
+grant execute on function public.save_localization(uuid, text, text, text, text, integer, text, text, text, text)
+    to service_role;